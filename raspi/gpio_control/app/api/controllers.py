@@ -4,11 +4,9 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 from flask import Blueprint, jsonify, request
-from app.config.config_manager import ConfigManager
 from app.config.plant_manager import PlantManager
 
 main = Blueprint('main', __name__)
-config_manager = ConfigManager()
 
 # These will be set by the main module
 relay_controller = None
@@ -16,14 +14,17 @@ water_nutrient_controller = None
 event_controller = None
 sensor_hub_controller = None 
 plant_manager = None
+config_manager = None
 
-def set_controllers(relay, water_nutrient, event, sensor_hub, plant):
-    global relay_controller, water_nutrient_controller, event_controller, sensor_hub_controller, plant_manager
+def set_controllers(relay, water_nutrient, event, sensor_hub, plant, config):
+    global relay_controller, water_nutrient_controller, event_controller, sensor_hub_controller, plant_manager, config_manager
     relay_controller = relay
     water_nutrient_controller = water_nutrient
     event_controller = event
     sensor_hub_controller = sensor_hub
     plant_manager = plant
+    # Share the controllers' ConfigManager so changes made through the API (e.g. /enable) reach them
+    config_manager = config
 
 @main.route('/')
 def index():
@@ -47,16 +48,19 @@ def pin_status(pin):
 @main.route('/control/test', methods=['POST'])
 def test():
     logger.debug("Testing all relay pins")
-    relay_controller.test()
-    logger.info("Test completed")
-    return jsonify({"status": "success", "message": "Test completed"}), 200
+    mode = request.args.get('mode', 'sequential')
+    if mode not in ('sequential', 'parallel'):
+        return jsonify({"status": "error", "message": f"Unknown test mode: {mode}"}), 400
+    message = relay_controller.test(parallel=mode == 'parallel')
+    logger.info("Test requested: %s", message)
+    return jsonify({"status": "success", "message": message}), 200
 
 @main.route('/control/test/<int:pin>', methods=['POST'])
 def test_pin(pin):
     logger.debug("Testing pin %d", pin)
-    relay_controller.test_pin(pin)
-    logger.info("Test completed for pin %d", pin)
-    return jsonify({"status": "success", "message": f"Test completed for pin {pin}"}), 200
+    message = relay_controller.test_pin(pin)
+    logger.info("Test requested for pin %d: %s", pin, message)
+    return jsonify({"status": "success", "message": f"{message} for pin {pin}"}), 200
 
 @main.route('/water-nutrient/mix', methods=['POST'])
 def mix_nutrients():
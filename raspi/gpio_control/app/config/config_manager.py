@@ -1,17 +1,43 @@
+import atexit
 import json
 import os
+import threading
+
+try:
+    import orjson
+except ImportError:  # Not every platform has a wheel, the stdlib json module works everywhere
+    orjson = None
 
 CONFIG_FILE_PATH = '/app/app/config/settings.json'
+SAVE_DELAY = 0.5  # seconds, changes within this window are written to disk together
+
+def _read_json(path):
+    if orjson is not None:
+        with open(path, 'rb') as file:
+            return orjson.loads(file.read())
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def _write_json(path, data):
+    # Always written by the stdlib, so the hand-edited file keeps indent=4 whether orjson is installed or not.
+    # Writes are debounced and rare, only loading benefits from orjson
+    with open(path, 'w') as file:
+        json.dump(data, file, indent=4)
 
 class ConfigManager:
     def __init__(self, config_file=CONFIG_FILE_PATH):
         self.config_file = config_file
         self.config = self.load_config()
+        self._subscribers = {}
+        # Guards self.config as well as the pending save, flush() serializes the config on the timer thread
+        self._save_lock = threading.RLock()
+        self._save_timer = None
+        self._dirty = False
+        atexit.register(self.flush)
 
     def load_config(self):
         if os.path.exists(self.config_file):
-            with open(self.config_file, 'r') as file:
-                return json.load(file)
+            return _read_json(self.config_file)
         else:
             default_config = {
                 "water_nutrient": {
@@ -49,13 +75,37 @@ class ConfigManager:
                     },
                 }
             }
-            with open(self.config_file, 'w') as file:
-                json.dump(default_config, file, indent=4)
+            _write_json(self.config_file, default_config)
             return default_config
 
     def save_config(self):
-        with open(self.config_file, 'w') as file:
-            json.dump(self.config, file, indent=4)
+        """
+        Marks the config as changed and schedules writing it to disk.
+        Reads are always served from memory, so bursts of set() calls are coalesced into one write.
+        """
+        with self._save_lock:
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(SAVE_DELAY, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self):
+        """
+        Writes pending changes to disk right away.
+        The file is replaced atomically, so a crash mid-write never leaves a truncated config behind.
+        """
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            temp_file = self.config_file + '.tmp'
+            _write_json(temp_file, self.config)
+            os.replace(temp_file, self.config_file)
+            self._dirty = False
+
     def get(self, key, default=None):
         keys = key.split('.')
         config_section = self.config
@@ -69,53 +119,68 @@ class ConfigManager:
 
     def set(self, key, value):
         keys = key.split('.')
-        config_section = self.config
+        with self._save_lock:
+            config_section = self.config
 
-        for k in keys[:-1]:
-            if k not in config_section:
-                config_section[k] = {}  # Create a new dict if the key doesn't exist
-            config_section = config_section[k]
+            for k in keys[:-1]:
+                if k not in config_section:
+                    config_section[k] = {}  # Create a new dict if the key doesn't exist
+                config_section = config_section[k]
+
+            config_section[keys[-1]] = value
+            self.save_config()
+        for callback in self._subscribers.get(key, ()):
+            callback(value)
 
-        config_section[keys[-1]] = value
-        self.save_config()
+    def subscribe(self, key, callback):
+        """
+        Registers a callback that is called with the new value whenever the key is changed through set().
+
+        :param key: Dotted config key to watch, e.g. 'abort_mode'
+        :param callback: Callable taking the new value
+        """
+        self._subscribers.setdefault(key, []).append(callback)
         
     def add_to_array(self, key, value):
         keys = key.split('.')
-        config_section = self.config
+        with self._save_lock:
+            config_section = self.config
 
-        for k in keys[:-1]:
-            if k not in config_section:
-                config_section[k] = {}
-            config_section = config_section[k]
+            for k in keys[:-1]:
+                if k not in config_section:
+                    config_section[k] = {}
+                config_section = config_section[k]
 
-        if keys[-1] not in config_section:
-            config_section[keys[-1]] = []
+            if keys[-1] not in config_section:
+                config_section[keys[-1]] = []
 
-        config_section[keys[-1]].append(value)
-        self.save_config()
+            config_section[keys[-1]].append(value)
+            self.save_config()
 
     def remove_from_array(self, key, value):
         keys = key.split('.')
-        config_section = self.config
+        with self._save_lock:
+            config_section = self.config
 
-        for k in keys[:-1]:
-            if k not in config_section:
-                return  # Key does not exist
-            config_section = config_section[k]
+            for k in keys[:-1]:
+                if k not in config_section:
+                    return  # Key does not exist
+                config_section = config_section[k]
 
-        if keys[-1] in config_section and value in config_section[keys[-1]]:
-            config_section[keys[-1]].remove(value)
-            self.save_config()
+            if keys[-1] in config_section and value in config_section[keys[-1]]:
+                config_section[keys[-1]].remove(value)
+                self.save_config()
 
     def edit_in_array(self, key, index, new_value):
         keys = key.split('.')
-        config_section = self.config
+        with self._save_lock:
+            config_section = self.config
 
-        for k in keys[:-1]:
-            if k not in config_section:
-                return  # Key does not exist
-            config_section = config_section[k]
+            for k in keys[:-1]:
+                if k not in config_section:
+                    return  # Key does not exist
+                config_section = config_section[k]
 
-        if keys[-1] in config_section and 0 <= index < len(config_section[keys[-1]]):
-            config_section[keys[-1]][index] = new_value
-            self.save_config()
\ No newline at end of file
+            if keys[-1] in config_section and 0 <= index < len(config_section[keys[-1]]):
+                config_section[keys[-1]][index] = new_value
+                self.save_config()
\ No newline at end of file
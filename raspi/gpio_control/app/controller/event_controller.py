@@ -1,12 +1,13 @@
 import logging
-import schedule
 import asyncio
-from datetime import datetime
-from app.sensors.capacitive_moisture_sensor import CapacitiveMoistureSensor
+from collections import namedtuple
+from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+ScheduledJob = namedtuple('ScheduledJob', 'next_run job_func')
+
 class EventController:
     """
     Manages the scheduling and triggering of events for the grow system.
@@ -30,6 +31,12 @@ class EventController:
             self.plant_manager = plant_manager
             self.sensor_hub_controller = sensor_hub_controller
             self.moisture_check_interval = 1  # Default to 1 second
+            # time_of_day -> (next_run, TimerHandle), the handles are armed once monitor_events runs
+            self._scheduled_waterings = {}
+            self._loop = None
+            # Plants that were reported below their threshold or without data, so the warning is only logged on changes
+            self._plants_below_threshold = set()
+            self._plants_without_data = set()
             self.load_config()
             self.reapply_rules()
             self.latest_sensor_data = {}
@@ -83,7 +90,11 @@ class EventController:
         """
         try:
             self.logger.debug("Scheduling daily watering at %s", time_of_day)
-            schedule.every().day.at(time_of_day).do(self.water_nutrient_controller.run_watering_cycle)
+            if time_of_day not in self._scheduled_waterings:
+                self._scheduled_waterings[time_of_day] = (self._next_run(time_of_day), None)
+                if self._loop is not None:
+                    # The API calls this from its own threads, timers are only armed on the event loop
+                    self._loop.call_soon_threadsafe(self._arm_watering, time_of_day)
             if {'time_of_day': time_of_day} not in self.scheduled_events:
                 self.scheduled_events.append({'time_of_day': time_of_day})
                 self.config_manager.set('event.scheduled_events', self.scheduled_events)
@@ -91,6 +102,44 @@ class EventController:
         except Exception as e:
             self.logger.error("Error scheduling daily watering: %s", e)
 
+    @staticmethod
+    def _next_run(time_of_day, after=None):
+        """
+        Returns the next occurrence of the given time of day.
+
+        :param time_of_day: Time of day in 24-hour format, e.g., '08:00'.
+        :param after: Point in time to look from, defaults to now.
+        """
+        after = after or datetime.now()
+        hour, minute = (int(part) for part in time_of_day.split(':')[:2])
+        next_run = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if next_run <= after:
+            next_run += timedelta(days=1)
+        return next_run
+
+    def _arm_watering(self, time_of_day, after=None):
+        """
+        Lets the event loop call the watering at its next run, the loop sleeps until then.
+        """
+        next_run = self._next_run(time_of_day, after)
+        delay = (next_run - datetime.now()).total_seconds()
+        handle = self._loop.call_at(self._loop.time() + delay, self._run_scheduled_watering, time_of_day)
+        self._scheduled_waterings[time_of_day] = (next_run, handle)
+
+    def _run_scheduled_watering(self, time_of_day):
+        next_run, _ = self._scheduled_waterings[time_of_day]
+        # Re-arm from the planned run, so a timer firing a little early can't run twice
+        self._arm_watering(time_of_day, after=next_run)
+        self._loop.create_task(self._run_watering_cycle(time_of_day))
+
+    async def _run_watering_cycle(self, time_of_day):
+        try:
+            self.logger.info("Running scheduled watering for %s", time_of_day)
+            async with self._watering_lock:
+                await asyncio.to_thread(self.water_nutrient_controller.run_watering_cycle)
+        except Exception as e:
+            self.logger.error("Error running scheduled watering: %s", e)
+
     def set_moisture_threshold(self, sensor_id, threshold):
         try:
             self.logger.debug("Setting moisture threshold: id=%s, threshold=%d", sensor_id, threshold)
@@ -122,47 +171,72 @@ class EventController:
 
     async def monitor_events(self):
         """
-        Continuously checks and runs scheduled tasks and monitors moisture sensors.
+        Runs the scheduled waterings and monitors the moisture sensors.
         This function should be run as an asynchronous task in the main event loop.
         """
+        self._loop = asyncio.get_running_loop()
+        # Scheduled and moisture triggered waterings share the mixer, so only one runs at a time
+        self._watering_lock = asyncio.Lock()
+        for time_of_day in list(self._scheduled_waterings):
+            self._arm_watering(time_of_day)
+        await self._monitor_moisture()
+
+    async def _monitor_moisture(self):
         try:
-            self.logger.debug("Starting event monitoring")
+            self.logger.debug("Starting moisture monitoring")
             while True:
-                self.check_moisture_levels()
+                # Checking the levels only reads cached sensor data, so it runs right on the loop.
+                # Watering blocks for as long as the pumps run, so that is kept off the event loop.
+                for plant_id in self.check_moisture_levels():
+                    async with self._watering_lock:
+                        await asyncio.to_thread(self.trigger_watering, plant_id)
                 self.logger.debug("sleeping for %d seconds", self.config_manager.get('event.moisture_check_interval', 60))
-                await asyncio.sleep(self.config_manager.get('event.moisture_check_interval', 60))  # Check every second for pending tasks and moisture levels
+                await asyncio.sleep(self.config_manager.get('event.moisture_check_interval', 60))
         except Exception as e:
             self.logger.error("Error monitoring events: %s", e)
     
     def check_moisture_levels(self):
+        """
+        Compares the latest moisture readings with the start thresholds of all plants.
+
+        :return: List of plant ids that need watering
+        """
+        plants_to_water = []
         if self.config_manager.get('abort_mode', False):
             self.logger.warning("ABORT mode active, skipping moisture level check")
-            return
+            return plants_to_water
 
         try:
             self.logger.debug("Checking moisture levels for all plants")
+            # Fetch the readings of all sensors once per check instead of once per plant
+            latest_sensor_data = self.sensor_hub_controller.get_latest_sensor_data()
             for plant_id, plant_data in self.plant_manager.get_all_plants().items():
-                self.logger.debug(f"Checking moisture level for plant {plant_id}")
                 sensor_id = plant_data['moisture_sensor_id']
-                sensor_data = self.sensor_hub_controller.get_latest_sensor_data().get(sensor_id)
-                self.logger.debug(f"Sensor data for plant {plant_id}: sensor_id={sensor_id}, sensor_data={sensor_data}")
+                sensor_data = latest_sensor_data.get(sensor_id)
+                self.logger.debug("Sensor data for plant %s: sensor_id=%s, sensor_data=%s", plant_id, sensor_id, sensor_data)
                 if sensor_data and 'percentage' in sensor_data:
+                    self._plants_without_data.discard(plant_id)
                     moisture_level = sensor_data['percentage']
-                    self.logger.debug(f"Checking moisture level for plant {plant_id}: {moisture_level}%")
-                    if 'watering_threshold' not in plant_data or 'start_watering' not in plant_data['watering_threshold']:
-                        self.logger.debug(f"No valid watering threshold config for plant {plant_id}, sensor {sensor_id}")
+                    start_threshold = plant_data.get('watering_threshold', {}).get('start_watering')
+                    if start_threshold is None:
+                        self.logger.debug("No valid watering threshold config for plant %s, sensor %s", plant_id, sensor_id)
                         continue
-                    
-                    start_threshold = plant_data['watering_threshold']['start_watering']
-                    self.logger.debug(f"Start threshold for plant {plant_id}: {start_threshold}%")
-                    self.logger.debug(f"Moisture level {moisture_level}% is below start threshold {start_threshold}%" if moisture_level < start_threshold else f"Moisture level {moisture_level}% is above start threshold {start_threshold}%")
+
+                    self.logger.debug("Moisture level for plant %s: %s%%, start threshold: %s%%", plant_id, moisture_level, start_threshold)
                     if moisture_level < start_threshold:
-                        self.logger.warning(f"Moisture level below start threshold for plant {plant_id}: {moisture_level}% < {start_threshold}%")
-                        self.trigger_watering(plant_id)
-                else:
-                    self.logger.warning(f"No valid moisture data for plant {plant_id}, sensor {sensor_id}")
+                        if plant_id not in self._plants_below_threshold:
+                            self._plants_below_threshold.add(plant_id)
+                            self.logger.warning("Moisture level below start threshold for plant %s: %s%% < %s%%", plant_id, moisture_level, start_threshold)
+                        plants_to_water.append(plant_id)
+                    elif plant_id in self._plants_below_threshold:
+                        self._plants_below_threshold.discard(plant_id)
+                        self.logger.info("Moisture level back above start threshold for plant %s: %s%% >= %s%%", plant_id, moisture_level, start_threshold)
+                elif plant_id not in self._plants_without_data:
+                    self._plants_without_data.add(plant_id)
+                    self.logger.warning("No valid moisture data for plant %s, sensor %s", plant_id, sensor_id)
         except Exception as e:
             self.logger.error("Error checking moisture levels: %s", e)
+        return plants_to_water
 
     def trigger_watering(self, plant_name):
         try:
@@ -180,7 +254,10 @@ class EventController:
         """
         try:
             self.logger.debug("Getting scheduled events")
-            return schedule.jobs
+            return [
+                ScheduledJob(next_run, self.water_nutrient_controller.run_watering_cycle)
+                for next_run, _ in sorted(self._scheduled_waterings.values(), key=lambda entry: entry[0])
+            ]
         except Exception as e:
             self.logger.error("Error getting scheduled events: %s", e)
             return []
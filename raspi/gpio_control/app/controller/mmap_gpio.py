@@ -0,0 +1,101 @@
+import mmap
+import os
+import struct
+
+"""
+Direct access to the GPIO registers of the BCM2835/BCM2711 (Raspberry Pi 1-4) through /dev/gpiomem.
+/dev/gpiomem exposes only the GPIO block, so no root privileges and no physical base address are needed.
+The Raspberry Pi 5 routes its GPIOs through the RP1 chip and is not supported, callers should fall back to pigpio.
+"""
+
+GPIO_MEM_DEVICE = '/dev/gpiomem'
+GPIO_BLOCK_SIZE = 4096
+DEVICE_TREE_COMPATIBLE = '/proc/device-tree/compatible'
+# SoCs with the BCM2835 GPIO register layout (Raspberry Pi 1-4)
+SUPPORTED_SOCS = (b'brcm,bcm2835', b'brcm,bcm2836', b'brcm,bcm2837', b'brcm,bcm2711')
+
+# Precompiled register word format and the bit of every pin, so a register access doesn't parse
+# the format string or shift on every call
+_REGISTER = struct.Struct('<I')
+_PIN_BITS = tuple(1 << pin for pin in range(32))
+
+# Register offsets within the GPIO block
+GPSET0 = 0x1C  # Writing a 1 bit drives GPIO 0-31 high
+GPCLR0 = 0x28  # Writing a 1 bit drives GPIO 0-31 low
+GPLEV0 = 0x34  # Pin levels of GPIO 0-31
+
+
+def _check_soc(compatible_path=DEVICE_TREE_COMPATIBLE):
+    """
+    Makes sure the board has the BCM2835 register layout before anything is mapped,
+    so the registers of a different GPIO block are never written.
+
+    :raises OSError: If the SoC is not supported or can't be determined
+    """
+    with open(compatible_path, 'rb') as file:
+        compatible = file.read().split(b'\0')
+    if not any(soc in compatible for soc in SUPPORTED_SOCS):
+        raise OSError(f"Unsupported SoC for memory mapped GPIO access: {b', '.join(filter(None, compatible)).decode()}")
+
+
+class MMapGPIOReader:
+    _OPEN_FLAGS = os.O_RDONLY
+    _PROT = mmap.PROT_READ
+
+    def __init__(self, device=GPIO_MEM_DEVICE):
+        """
+        Maps the GPIO registers into memory.
+
+        :param device: GPIO memory device to map
+        :raises OSError: If the device is missing or not accessible, or the board is not supported
+        """
+        _check_soc()
+        fd = os.open(device, self._OPEN_FLAGS | os.O_SYNC)
+        try:
+            self._mem = mmap.mmap(fd, GPIO_BLOCK_SIZE, mmap.MAP_SHARED, self._PROT)
+        finally:
+            os.close(fd)
+
+    def read(self, pin):
+        """
+        Reads the level of a GPIO pin with a single register load.
+
+        :param pin: BCM pin number (0-31)
+        :return: 1 if the pin is high, 0 if it is low
+        """
+        return (_REGISTER.unpack_from(self._mem, GPLEV0)[0] >> pin) & 1
+
+    def close(self):
+        self._mem.close()
+
+
+class MMapGPIOBackend(MMapGPIOReader):
+    """
+    Drives GPIO outputs by storing straight into the GPSET0/GPCLR0 registers instead of
+    sending every write through the pigpio daemon socket.
+    Offers the write methods of pigpio.pi used by the RelayController, so it can stand in for it.
+    Pin modes are not touched, the pins have to be configured as outputs through pigpio first.
+    """
+    _OPEN_FLAGS = os.O_RDWR
+    _PROT = mmap.PROT_READ | mmap.PROT_WRITE
+
+    def write(self, pin, level):
+        """
+        Drives a single pin high or low with one register store.
+
+        :param pin: BCM pin number (0-31)
+        :param level: 1 for high, 0 for low
+        """
+        _REGISTER.pack_into(self._mem, GPSET0 if level else GPCLR0, _PIN_BITS[pin])
+
+    def set_bank_1(self, mask):
+        """
+        Drives all pins in the mask high.
+        """
+        _REGISTER.pack_into(self._mem, GPSET0, mask)
+
+    def clear_bank_1(self, mask):
+        """
+        Drives all pins in the mask low.
+        """
+        _REGISTER.pack_into(self._mem, GPCLR0, mask)
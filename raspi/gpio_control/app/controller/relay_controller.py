@@ -1,7 +1,10 @@
-import time
+import atexit
 import logging
+from contextlib import contextmanager
 from datetime import datetime
 
+from app.controller.mmap_gpio import MMapGPIOBackend
+
 """
 Pin configuration for the pump system on a Raspberry Pi 4B
 nutrients pumps (3 pieces)
@@ -69,112 +72,346 @@ unused_gpio_ports = [2, 3, 4, 7, 8, 9, 10, 11, 14, 15, 22, 23, 24, 25, 26]
 
 import pigpio
 
+PIGPIO_HOST = 'gpio_deamon'
+_PI = None
+
+def get_pi():
+    """
+    Returns the pigpio connection shared by all controllers and sensors, so the daemon only serves
+    one socket (and notification thread) for this process. pigpio serialises commands on a connection
+    with a lock, so it is safe to use from several threads.
+    A failed connection is not cached, the next call tries again.
+    """
+    global _PI
+    if _PI is None or not _PI.connected:
+        _PI = pigpio.pi(PIGPIO_HOST)
+        if _PI.connected:
+            # Users of the shared connection must not stop it, it is closed here at exit
+            atexit.register(_PI.stop)
+    return _PI
+
+TEST_PULSE_US = 1_000_000  # How long each relay is switched on during a test
+# Pins reported by get_status with their status keys, built once instead of on every status request
+STATUS_PINS = tuple((pin, f'GPIO{pin}') for pin in range(2, 28))
+
 class RelayController:
     def __init__(self, logger, config_manager):
         self.logger = logger
         self.config_manager = config_manager
         self.logger.debug("Initializing RelayController")
-        self.pi = pigpio.pi('gpio_deamon')  # Connect to local Pi.
+        self.pi = get_pi()  # Connect to local Pi.
 
         if not self.pi.connected:
             self.logger.error("Failed to connect to pigpio daemon")
             exit()
+        # Pin levels are written through this backend, pin modes and reads always go through pigpio
+        self._backend = self.pi
+        if self.config_manager.get('relay.mmap_gpio', False):
+            try:
+                self._backend = MMapGPIOBackend()
+                self.logger.info("Writing relay outputs through memory mapped GPIO registers")
+            except OSError as e:
+                self.logger.warning("Memory mapped GPIO access unavailable, falling back to pigpio: %s", e)
         self.logger.info("RelayController initialized")
 
         self.output_pins = set()
+        self.output_mask = 0  # Bank mask of all output pins, so abort can switch them off in one write
         self.input_pins = set()
+        self._test_waves = {}  # pigpio wave ids of the test pulse trains, keyed by the pins they pulse and the mode
+        self._mode_cache = {}  # Pin modes only change in init_gpio_*, so get_status doesn't have to ask the daemon
 
     def init_gpio_output(self, pins):
         if self.config_manager.get('abort_mode', False):
             self.logger.warning("Attempted to initialize GPIO outputs while in ABORT mode")
-            return
+            return False
 
+        # Latch all pins HIGH (relays off) with one bank write before switching them to outputs,
+        # so no relay clicks on while the pins are being set up
+        mask = self.bank_mask(pins)
+        if mask:
+            self._backend.set_bank_1(mask)  # Set to HIGH
         for pin in pins:
             self.pi.set_mode(pin, pigpio.OUTPUT)
-            self.pi.write(pin, 1)  # Set to HIGH
-            self.output_pins.add(pin)
-            self.logger.debug("Pin %d state: %d", pin, self.get_pin_state(pin))        
+            self._mode_cache[pin] = 'OUTPUT'
+        self.output_pins.update(pins)
+        self.output_mask |= mask
         self.logger.debug("GPIOs Outputs initialized: %s", pins)
+        return True
 
     def init_gpio_input(self, pins):
         if self.config_manager.get('abort_mode', False):
             self.logger.warning("Attempted to initialize GPIO inputs while in ABORT mode")
-            return
+            return False
+        # Reading the pins back costs a daemon round-trip each, only worth it when debug output is wanted
+        debug = self.logger.isEnabledFor(logging.DEBUG)
         for pin in pins:
             self.pi.set_mode(pin, pigpio.INPUT)
+            self._mode_cache[pin] = 'INPUT'
             self.input_pins.add(pin)
-            self.logger.debug("Pin %d state: %d", pin, self.get_pin_state(pin))        
+            if debug:
+                self.logger.debug("Pin %d state: %d", pin, self.get_pin_state(pin))
         self.logger.debug("GPIOs Inputs initialized: %s", pins)
+        return True
 
     def turn_on(self, pin):
         if self.config_manager.get('abort_mode', False):
-            self.logger.warning(f"Attempted to turn on pin {pin} while in ABORT mode")
+            self.logger.warning("Attempted to turn on pin %d while in ABORT mode", pin)
             return False
         return self._turn_on_impl(pin)
 
     def _turn_on_impl(self, pin):
-        self.pi.write(pin, 0)  # Set to LOW
+        self._backend.write(pin, 0)  # Set to LOW
         self.logger.info("Turned on pin %d", pin)
         return True
 
     def turn_off(self, pin):
         try:
-            if not pin == -1 and not self.config_manager.get('abort_mode', False):
-                self.pi.write(pin, 1)
+            # Turning a relay off is always safe, so it is also done in ABORT mode
+            if pin != -1:
+                self._backend.write(pin, 1)
                 self.logger.info("Turned off pin %d", pin)
             return True
         except Exception as e:
-            self.logger.error(f"Failed to turn off pin {pin}: {str(e)}")
+            self.logger.error("Failed to turn off pin %d: %s", pin, e)
+            return False
+
+    @contextmanager
+    def pump_on(self, pin):
+        """
+        Keeps a pump running for the duration of a with-block.
+        The pump is turned off again when the block is left, also if it raised.
+
+        :param pin: Pin of the pump
+        """
+        self.turn_on(pin)
+        try:
+            yield
+        finally:
+            self.turn_off(pin)
+
+    def turn_on_mask(self, mask):
+        """
+        Turns on all pins in a precomputed bank mask with a single write.
+
+        :param mask: Bank mask as returned by bank_mask()
+        """
+        if self.config_manager.get('abort_mode', False):
+            self.logger.warning("Attempted to turn on pins in mask %#x while in ABORT mode", mask)
+            return False
+        try:
+            if mask:
+                self._backend.clear_bank_1(mask)  # Set to LOW
+                self.logger.info("Turned on pins in mask %#x", mask)
+            return True
+        except Exception as e:
+            self.logger.error("Failed to turn on pins in mask %#x: %s", mask, e)
+            return False
+
+    def turn_off_mask(self, mask):
+        """
+        Turns off all pins in a precomputed bank mask with a single pigpio write.
+        Turning relays off is always safe, so this also works while in ABORT mode.
+
+        :param mask: Bank mask as returned by bank_mask()
+        """
+        try:
+            if mask:
+                self._backend.set_bank_1(mask)  # Set to HIGH
+                self.logger.info("Turned off pins in mask %#x", mask)
+            return True
+        except Exception as e:
+            self.logger.error("Failed to turn off pins in mask %#x: %s", mask, e)
             return False
 
+    @staticmethod
+    def bank_mask(pins):
+        mask = 0
+        for pin in pins:
+            if pin != -1:
+                mask |= 1 << pin
+        return mask
+
     def get_status(self):
         self.logger.debug("Getting GPIO status")
         status = {}
-        for pin in range(2, 28):
-            mode = self.pi.get_mode(pin)
-            mode_str = 'INPUT' if mode == pigpio.INPUT else 'OUTPUT' if mode == pigpio.OUTPUT else 'UNKNOWN'
-            status[f'GPIO{pin}'] = {
-                'state': 'high' if self.get_pin_state(pin) == 1 else 'low',
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        bank = self.pi.read_bank_1()  # Levels of all pins in a single round-trip
+        for pin, name in STATUS_PINS:
+            mode_str = self._get_mode(pin)
+            state = 'high' if (bank >> pin) & 1 else 'low'
+            status[name] = {
+                'state': state,
                 'mode': mode_str,
                 'controlled': False
             }
-            self.logger.debug("Pin %d: mode=%s, state=%s", pin, mode_str, status[f'GPIO{pin}']['state'])
-        self.logger.info("GPIO status retrieved")
+            if debug:
+                self.logger.debug("Pin %d: mode=%s, state=%s", pin, mode_str, state)
+        self.logger.debug("GPIO status retrieved")
         return {
             'gpio_status': status,
             'timestamp': datetime.now().isoformat(),
             'abort_mode': self.config_manager.get('abort_mode', False)
         }
 
+    def _get_mode(self, pin):
+        """
+        Returns the cached mode of a pin. Pins not configured by this controller are asked
+        from the daemon once and cached as well.
+        """
+        mode_str = self._mode_cache.get(pin)
+        if mode_str is None:
+            mode = self.pi.get_mode(pin)
+            mode_str = 'INPUT' if mode == pigpio.INPUT else 'OUTPUT' if mode == pigpio.OUTPUT else 'UNKNOWN'
+            self._mode_cache[pin] = mode_str
+        return mode_str
+
     def get_pin_state(self, pin):
         state = self.pi.read(pin)
         self.logger.debug("State for pin %d: %d", pin, state)
         return state
 
-    def test(self):
+    def edge_callback(self, pin, func, edge=pigpio.RISING_EDGE):
+        """
+        Registers func(pin, level, tick) to be called from the pigpio notification thread
+        whenever the pin sees the given edge.
+
+        :param pin: Pin to watch
+        :param func: Function to call on the edge
+        :param edge: pigpio.RISING_EDGE, pigpio.FALLING_EDGE or pigpio.EITHER_EDGE
+        :return: pigpio callback handle, cancel() stops the notifications
+        """
+        return self.pi.callback(pin, edge, func)
+
+    def test(self, parallel=False):
+        """
+        Tests all relay outputs.
+
+        :param parallel: Pulse all relays at once as a quick smoke test instead of one after another
+        """
         if self.config_manager.get('abort_mode', False):
             self.logger.warning("Attempted to run test while in ABORT mode")
             return "Test aborted due to ABORT mode"
         self.logger.debug("Testing all relay pins")
-        for pin in self.relay_pins:
-            self.test_pin(pin)
-        self.logger.info("Test completed")
-        return "Test completed"
-    
+        return self._send_test_wave(tuple(sorted(self.output_pins)), parallel)
+
     def test_pin(self, pin):
         if self.config_manager.get('abort_mode', False):
-            self.logger.warning(f"Attempted to test pin {pin} while in ABORT mode")
+            self.logger.warning("Attempted to test pin %s while in ABORT mode", pin)
             return "Test aborted due to ABORT mode"
+        if pin not in self.output_pins:
+            self.logger.warning("Attempted to test pin %s which is not configured as a relay output", pin)
+            return "Test aborted, pin is not a relay output"
         self.logger.debug("Testing pin %d", pin)
-        self.pi.write(pin, 0)  # Set to LOW
-        time.sleep(1)  # Sleep for exactly 1 second
-        self.pi.write(pin, 1)  # Set to HIGH
-        self.logger.info("Test completed for pin %d", pin)
-        return "Test completed"
+        return self._send_test_wave((pin,))
+
+    def play_wave(self, steps):
+        """
+        Plays a sequence of relay switching steps as a pigpio waveform, timed by the daemon's DMA engine
+        instead of sleeps and writes from Python.
+
+        :param steps: List of (pins_on, pins_off, delay_us) tuples, each step switches its pins and then waits delay_us
+        :return: Id of the playing wave, or None if ABORT mode is active, another wave is already playing
+                 or the daemon couldn't start the wave
+        """
+        if self.config_manager.get('abort_mode', False):
+            self.logger.warning("Attempted to play a waveform while in ABORT mode")
+            return None
+        wave_id = None
+        try:
+            if self.pi.wave_tx_busy():
+                return None
+            # The relays are active-low, so pins to turn on are cleared and pins to turn off are set
+            self.pi.wave_add_generic([
+                pigpio.pulse(self.bank_mask(pins_off), self.bank_mask(pins_on), delay_us)
+                for pins_on, pins_off, delay_us in steps
+            ])
+            wave_id = self.pi.wave_create()
+            self.pi.wave_send_once(wave_id)
+        except Exception as e:
+            self.logger.error("Failed to play waveform: %s", e)
+            try:
+                if wave_id is None:
+                    self.pi.wave_add_new()  # Drop the pulses that didn't make it into a wave
+                else:
+                    self._delete_wave(wave_id)
+            except Exception as e:
+                self.logger.error("Failed to clean up waveform: %s", e)
+            return None
+        self.logger.debug("Playing wave %d with %d steps", wave_id, len(steps))
+        return wave_id
+
+    def wave_busy(self):
+        try:
+            return bool(self.pi.wave_tx_busy())
+        except Exception as e:
+            self.logger.error("Failed to check waveform state: %s", e)
+            return False
+
+    def stop_wave(self, wave_id=None):
+        """
+        Stops the playing waveform. The pins keep the level they had, callers switch the relays off themselves.
+
+        :param wave_id: Id returned by play_wave(), deleted from the daemon if given
+        """
+        try:
+            self.pi.wave_tx_stop()
+            if wave_id is not None:
+                self._delete_wave(wave_id)
+        except Exception as e:
+            self.logger.error("Failed to stop waveform: %s", e)
+
+    def _delete_wave(self, wave_id):
+        # The daemon hands out freed ids again, so the cached test waves can't be trusted afterwards
+        self._test_waves.clear()
+        self.pi.wave_delete(wave_id)
+
+    def _send_test_wave(self, pins, parallel=False):
+        """
+        Pulses the given relays one after another, each one on for TEST_PULSE_US.
+        The pulse train is played by the pigpio daemon as a DMA timed waveform, so this returns
+        immediately instead of blocking the request for the length of the test.
+
+        :param pins: Tuple of pins to pulse in order
+        :param parallel: Pulse all pins together for a single TEST_PULSE_US instead
+        """
+        if not pins:
+            return "No relay pins to test"
+        key = (pins, parallel)
+        wave_id = None
+        try:
+            if self.pi.wave_tx_busy():
+                self.logger.warning("Attempted to start a test while another test is running")
+                return "Test already running"
+            wave_id = self._test_waves.get(key)
+            if wave_id is None:
+                if parallel:
+                    mask = self.bank_mask(pins)
+                    pulses = [pigpio.pulse(0, mask, TEST_PULSE_US), pigpio.pulse(mask, 0, 0)]
+                else:
+                    pulses = []
+                    for pin in pins:
+                        pulses.append(pigpio.pulse(0, 1 << pin, TEST_PULSE_US))  # Set to LOW
+                        pulses.append(pigpio.pulse(1 << pin, 0, 0))  # Set to HIGH
+                self.pi.wave_add_generic(pulses)
+                wave_id = self.pi.wave_create()
+                self._test_waves[key] = wave_id
+            self.pi.wave_send_once(wave_id)
+        except Exception as e:
+            # The cached id may be stale, e.g. after a daemon restart, so it is created again next time
+            self.logger.error("Failed to start test for pins %s: %s", pins, e)
+            self._test_waves.pop(key, None)
+            try:
+                if wave_id is None:
+                    self.pi.wave_add_new()  # Drop the pulses that didn't make it into a wave
+            except Exception as e:
+                self.logger.error("Failed to clean up waveform: %s", e)
+            return "Test failed to start"
+        self.logger.info("Test started for pins %s", pins)
+        return "Test started"
 
     def abort(self):
         self.logger.debug("Executing ABORT command")
-        for pin in self.output_pins:
-            self.turn_off(pin)
+        self.stop_wave()  # Stop a running test or distribution, it would switch relays on again
+        self.turn_off_mask(self.output_mask)
         self.config_manager.set('abort_mode', True)
         self.logger.info("ABORT command executed, all pins turned off")
@@ -6,6 +6,8 @@ import json
 from collections import deque
 
 class SensorHubController:
+    COMMAND_TOPIC = "arduino/commands"
+
     def __init__(self, logger, config_manager, mqtt_broker="mqtt", mqtt_port=1883):
         threading.Thread.__init__(self)
         self.logger = logger
@@ -16,10 +18,15 @@ class SensorHubController:
         self.last_sensor_data = {}
         self.sensor_readings = {}  # Dictionary to store the last n readings for each sensor
         self.subscribed_topics = []  # Keep track of subscribed topics
+        self.sensor_data_events = {}  # Set whenever a new reading for the sensor arrives
 
         self.logger.debug("Initializing SensorHubController with MQTT broker: %s, port: %d", mqtt_broker, mqtt_port)
         
         self.client = mqtt_client.Client(client_id="sensor_hub_controller", clean_session=True, userdata=None, callback_api_version=mqtt_client.CallbackAPIVersion.VERSION2)
+        # Calibration drops the sensor interval to a few hundred ms and load_sensors() bursts
+        # one command per sensor, so don't let paho's small default inflight window throttle us.
+        self.client.max_inflight_messages_set(100)
+        self.client.max_queued_messages_set(0)  # 0 = unlimited
         self.client.connect(mqtt_broker, mqtt_port)
         self.load_subscriptions()
         
@@ -59,7 +66,9 @@ class SensorHubController:
                 self.add_sensor(label, sensor)
 
     def set_interval(self, interval):
-        self.send_command(f"SET_INTERVAL {interval}")
+        # The Arduino only understands a plain integer here, so never forward floats or other objects
+        self.interval = int(interval)
+        self.send_command(b"SET_INTERVAL " + str(self.interval).encode())
 
     def add_sensor(self, label, sensor):
         self.logger.debug(f"Adding sensor: {label}")
@@ -216,9 +225,10 @@ class SensorHubController:
         self.set_interval(ceil((delay * 500)/self.max_readings))  # Convert seconds to milliseconds
         
         readings = set()
-        start_time = time.time()
-        
-        while time.time() - start_time < calibration_time:
+        # Monotonic integer deadline, a clock step by NTP must not cut the calibration short or stretch it
+        deadline_ns = time.monotonic_ns() + int(calibration_time * 1_000_000_000)
+
+        while time.monotonic_ns() < deadline_ns:
             last_sensor_data = self.get_latest_sensor_data_by_sensor_id(topic)
             self.logger.info(f"Last sensor data: {last_sensor_data}")
             if last_sensor_data and 'value' in last_sensor_data:
@@ -241,35 +251,45 @@ class SensorHubController:
         self.set_interval(ceil(self.config_manager.get('sensor_hub.interval', 5000)/self.max_readings))  # Reset to 5 seconds, adjust as needed
         
     def on_message(self, client, userdata, message):
-        raw_data = message.payload.decode('utf-8')
-        self.logger.debug("Received data on topic: %s, payload: %s", message.topic, raw_data)
+        self.logger.debug("Received data on topic: %s, payload: %s", message.topic, message.payload)
+        # The serial proxy batches readings, one line protocol line per reading
+        for payload in message.payload.split(b'\n'):
+            if payload:
+                self.process_sensor_line(message.topic, payload)
+
+    def process_sensor_line(self, topic, payload):
         try:
-            
+
 # dht,humidity={humidity},temperature={temperature},sensor_id={sensor_id} value={humidity};{temperature} {timestamp}"
 # soil_moisture,sensor_id=0 value=277 1724263913.2976274
-            measurement, rest = raw_data.split(',', 1)
-            values, timestamp = rest.rsplit(' ', 1)  # Extract and remove the timestamp
-            fields, value = values.rsplit(' ', 1)  # Extract and remove the timestamp
+            # The payload is plain ASCII, so split the raw bytes and only decode the short
+            # fields we keep instead of decoding the whole message up front.
+            measurement, rest = payload.split(b',', 1)
+            measurement = measurement.decode('ascii')
+            values, timestamp = rest.rsplit(b' ', 1)  # Extract and remove the timestamp
+            fields, value = values.rsplit(b' ', 1)  # Extract and remove the timestamp
             data = {}
-            for field in fields.split(','):
-                key, field = field.split('=')
-                data[key] = field
+            for field in fields.split(b','):
+                key, field = field.split(b'=')
+                data[key.decode('ascii')] = field.decode('ascii')
             sensor_id = data['sensor_id']
-                
-            data['value'] = value.split('=')[1]
+
+            data['value'] = value.split(b'=')[1].decode('ascii')
             
             sensor_data_label = f"{measurement}_{sensor_id}"
             
-            if message.topic.startswith('sensor/dht'):
+            if topic.startswith('sensor/dht'):
                 self.update_dht_sensor_readings(sensor_data_label, data)
             else:
                 percentage = self.convert_to_percentage(sensor_data_label, float(data['value']))
                 self.update_sensor_readings(sensor_data_label, percentage, **data)
+            self.sensor_data_event(sensor_data_label).set()
             if sensor_data_label in self.last_sensor_data:
                 self.logger.debug(f"Sensor {sensor_id} data: {self.last_sensor_data[sensor_data_label]}")
-                self.publish_sensor_data(f"processed_{message.topic}", measurement, self.last_sensor_data[sensor_data_label])
+                self.publish_sensor_data(f"processed_{topic}", measurement, self.last_sensor_data[sensor_data_label])
         except ValueError as err:
             self.logger.error(err)
+            raw_data = payload.decode('utf-8', errors='replace')
             self.logger.error(f"Invalid sensor data received for measurement {measurement}: {raw_data}")
             self.last_sensor_data[sensor_data_label] = {"raw_value": raw_data, "percentage": None, "last_updated_at": time.time()}
     
@@ -376,7 +396,7 @@ class SensorHubController:
         :param command: The command to be sent to the Arduino.
         """
         self.logger.debug("Sending command to Arduino: %s", command)
-        self.client.publish("arduino/commands", command)
+        self.client.publish(self.COMMAND_TOPIC, command, qos=0, retain=False)
         self.logger.info("Command sent successfully: %s", command)
     
     def get_latest_sensor_data(self):
@@ -395,6 +415,26 @@ class SensorHubController:
         """
         return self.last_sensor_data.get(sensor_id)
 
+    def sensor_data_event(self, sensor_id):
+        """
+        Returns the event that is set whenever a new reading for the sensor arrives.
+        Clear it before checking the latest data and wait on it to sleep until the next reading.
+
+        :param sensor_id: The sensor data label, e.g. soil_moisture_0
+        :return: threading.Event of the sensor
+        """
+        event = self.sensor_data_events.get(sensor_id)
+        if event is None:
+            event = self.sensor_data_events.setdefault(sensor_id, threading.Event())
+        return event
+
+    def wake_sensor_data_waiters(self):
+        """
+        Wakes everyone waiting for sensor data, e.g. so they can notice an abort.
+        """
+        for event in list(self.sensor_data_events.values()):
+            event.set()
+
     def get_sensors(self):
         """
         Get all sensors from the configuration.
@@ -418,10 +458,16 @@ class SensorHubController:
         """
         self.send_command("CLEAR_ALL")
 
-    def set_max_readings(self, value):
+    def set_max_readings(self, value, interval=None):
+        """
+        :param value: Number of readings kept per sensor
+        :param interval: Interval to send to the Arduino, derived from sensor_hub.interval if not given
+        """
         self.max_readings = value
         self.config_manager.set('sensor_hub.max_readings', value)
-        self.set_interval(ceil(self.config_manager.get('sensor_hub.interval', 5000)/self.max_readings))
+        if interval is None:
+            interval = ceil(self.config_manager.get('sensor_hub.interval', 5000)/self.max_readings)
+        self.set_interval(interval)
         # Update existing deques
         for sensor in self.sensor_readings:
             self.sensor_readings[sensor] = deque(self.sensor_readings[sensor], maxlen=value)
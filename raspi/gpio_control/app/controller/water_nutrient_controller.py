@@ -1,11 +1,39 @@
 import logging
-from math import ceil
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+from collections import namedtuple
+from itertools import chain
 from datetime import datetime
+import threading
 import time
+import pigpio
+
+NS_PER_SECOND = 1_000_000_000
+US_PER_SECOND = 1_000_000
+
+# Pump settings are read on every pump run and abort, attribute access keeps that cheap
+Pump = namedtuple('Pump', 'pin flow_rate')
+
+def _to_pump(pump):
+    return Pump(pump['pin'], pump['flow_rate'])
+
+# Defaults used when the config has no entry, built once per process instead of on every load_config().
+# Pumps are converted to immutable Pump tuples, so the configuration can't alter the defaults.
+DEFAULT_NUTRIENT_PUMPS = {
+    'green': Pump(-1, 0.5),  # flow rate in ml/sec
+    'red': Pump(-1, 0.5),
+    'yellow': Pump(-1, 0.5)
+}
+DEFAULT_WATER_PUMP = Pump(16, 20)  # flow rate in ml/sec
+DEFAULT_DISTRIBUTION_PUMPS = {
+    'pump_1': Pump(5, 30),
+    'pump_2': Pump(20, 30),
+    'pump_3': Pump(13, 30),
+    'pump_4': Pump(6, 30),
+    'pump_5': Pump(19, 30)
+}
 
 class WaterNutrientController:
     """
@@ -27,6 +55,18 @@ class WaterNutrientController:
         self.config_manager = config_manager
         self.plant_controller = plant_controller
         self.sensor_controller = sensor_controller
+        # Set while ABORT mode is active, pump runs wait on it so an abort stops them immediately
+        self.abort_event = threading.Event()
+        # Wakes a running mixer fill, set by the mixer full edge callback and on abort
+        self._fill_stop_event = threading.Event()
+        self._mixer_full_callback = None
+        self._mixer_full = False  # Kept up to date by the mixer sensor edge callback
+        self._sync_abort_event()
+        self.config_manager.subscribe('abort_mode', self._on_abort_mode_changed)
+        self._active_nutrient_pumps = {}
+        self._all_pump_mask = 0
+        self._level_sensor_pins = {}
+        self._pin_layout = None  # Pins the GPIO modes were last set up for, load_config() skips the setup if unchanged
         self.load_config()
         self.logger.info("WaterNutrientController initialized with the following configuration:")
         self.logger.info("Nutrient Pumps: %s", self.nutrient_pumps)
@@ -41,21 +81,22 @@ class WaterNutrientController:
     def load_config(self):
         try:
             config = self.config_manager.get('water_nutrient', {})
-            self.nutrient_pumps = config.get('nutrient_pumps', {
-                'green': {'pin': -1, 'flow_rate': 0.5},  # flow rate in ml/sec
-                'red': {'pin': -1, 'flow_rate': 0.5},
-                'yellow': {'pin': -1, 'flow_rate': 0.5}
-            })
-            
-            self.water_pump = config.get('water_pump', {'pin': 16, 'flow_rate': 20})  # flow rate in ml/sec
+            nutrient_pumps = config.get('nutrient_pumps')
+            if nutrient_pumps is None:
+                self.nutrient_pumps = dict(DEFAULT_NUTRIENT_PUMPS)
+            else:
+                self.nutrient_pumps = {label: _to_pump(pump) for label, pump in nutrient_pumps.items()}
+            # Nutrient pumps without a pin are not connected, mix_nutrients only looks at the connected ones
+            self._active_nutrient_pumps = {label: pump for label, pump in self.nutrient_pumps.items() if pump.pin != -1}
             
-            self.distribution_pumps = config.get('distribution_pumps', {
-                'pump_1': {'pin': 5, 'flow_rate': 30},
-                'pump_2': {'pin': 20, 'flow_rate': 30},
-                'pump_3': {'pin': 13, 'flow_rate': 30},
-                'pump_4': {'pin': 6, 'flow_rate': 30},
-                'pump_5': {'pin': 19, 'flow_rate': 30}
-            })
+            water_pump = config.get('water_pump')
+            self.water_pump = DEFAULT_WATER_PUMP if water_pump is None else _to_pump(water_pump)
+
+            distribution_pumps = config.get('distribution_pumps')
+            if distribution_pumps is None:
+                self.distribution_pumps = dict(DEFAULT_DISTRIBUTION_PUMPS)
+            else:
+                self.distribution_pumps = {pump_id: _to_pump(pump) for pump_id, pump in distribution_pumps.items()}
             
             self.fill_level_sensor = config.get('fill_level_sensor', {
                 'mixer_full': {'pin': 26},
@@ -65,17 +106,48 @@ class WaterNutrientController:
             self.nutrient_amounts = config.get('nutrient_amounts', {'green': 50, 'red': 30, 'yellow': 20})
             self.total_water_ml = config.get('total_water_ml', 8000)
             self.ml_per_plant = config.get('ml_per_plant', 1000)
+            # Running all distribution pumps at once needs a supply that can handle the combined draw
+            self.parallel_distribution = config.get('parallel_distribution', False)
+            # Time sequential distribution with a pigpio waveform instead of sleeps in Python
+            self.wave_distribution = config.get('wave_distribution', False)
             self.logger.debug("Configuration loaded: %s", config)
             
-            gpio_output_pins = [pump['pin'] for pump in self.nutrient_pumps.values()]
-            gpio_output_pins.append(self.water_pump['pin'])
-            gpio_output_pins.extend([pump['pin'] for pump in self.distribution_pumps.values()])
-            gpio_output_pins = [pin for pin in gpio_output_pins if pin != -1]
-            
-            self.relay_controller.init_gpio_output(gpio_output_pins)
-            
-            gpio_input_pins = [sensor['pin'] for sensor in self.fill_level_sensor.values() if sensor['pin'] != -1]
-            self.relay_controller.init_gpio_input(gpio_input_pins)
+            all_pumps = chain(self.nutrient_pumps.values(), [self.water_pump], self.distribution_pumps.values())
+            # Pins shared by several pumps are initialized once, order preserved so the layout check stays stable
+            pump_pins = [pump.pin for pump in all_pumps if pump.pin != -1]
+            gpio_output_pins = list(dict.fromkeys(pump_pins))
+            if len(gpio_output_pins) != len(pump_pins):
+                self.logger.warning("Several pumps are configured on the same pin: %s",
+                                    sorted({pin for pin in pump_pins if pump_pins.count(pin) > 1}))
+            # Sensor name -> pin of the connected fill level sensors, resolved once for the level checks
+            self._level_sensor_pins = {name: sensor['pin'] for name, sensor in self.fill_level_sensor.items() if sensor['pin'] != -1}
+            gpio_input_pins = list(dict.fromkeys(self._level_sensor_pins.values()))
+            # Initializing a pump pin as sensor input would leave that pump unusable
+            shared_pins = set(gpio_input_pins).intersection(gpio_output_pins)
+            if shared_pins:
+                self.logger.error("Pins configured for both a pump and a fill level sensor, ignoring them as sensors: %s", sorted(shared_pins))
+                gpio_input_pins = [pin for pin in gpio_input_pins if pin not in shared_pins]
+            mixer_full_pin = self._level_sensor_pins.get('mixer_full', -1)
+            if self._mixer_full_callback is not None:
+                self._mixer_full_callback.cancel()
+                self._mixer_full_callback = None
+            if mixer_full_pin != -1:
+                # The daemon reports every change of the sensor, so neither filling nor is_mixer_full() has to read it
+                self._mixer_full_callback = self.relay_controller.edge_callback(
+                    mixer_full_pin, self._on_mixer_level, pigpio.EITHER_EDGE)
+            # The callback only reports changes, so start from the current level
+            self._mixer_full = self._read_mixer_full(mixer_full_pin)
+            # Abort switches every pump off with this one precomputed bank write
+            self._all_pump_mask = self.relay_controller.bank_mask(gpio_output_pins)
+
+            # Only touch the GPIOs when the pin layout actually changed since the last successful init
+            pin_layout = (tuple(gpio_output_pins), tuple(gpio_input_pins))
+            if self._pin_layout != pin_layout:
+                outputs_ready = self.relay_controller.init_gpio_output(gpio_output_pins)
+                inputs_ready = self.relay_controller.init_gpio_input(gpio_input_pins)
+                self._pin_layout = pin_layout if outputs_ready and inputs_ready else None
+            else:
+                self.logger.debug("GPIO pin layout unchanged, skipping GPIO initialization")
         except Exception as e:
             self.logger.error("Error loading configuration: %s", e)
         
@@ -83,13 +155,15 @@ class WaterNutrientController:
     def save_config(self):
         try:
             config = {
-                'nutrient_pumps': self.nutrient_pumps,
-                'water_pump': self.water_pump,
-                'distribution_pumps': self.distribution_pumps,
+                'nutrient_pumps': {label: pump._asdict() for label, pump in self.nutrient_pumps.items()},
+                'water_pump': self.water_pump._asdict(),
+                'distribution_pumps': {pump_id: pump._asdict() for pump_id, pump in self.distribution_pumps.items()},
                 'fill_level_sensor': self.fill_level_sensor,
                 'nutrient_amounts': self.nutrient_amounts,
                 'total_water_ml': self.total_water_ml,
-                'ml_per_plant': self.ml_per_plant
+                'ml_per_plant': self.ml_per_plant,
+                'parallel_distribution': self.parallel_distribution,
+                'wave_distribution': self.wave_distribution
             }
             self.config_manager.set('water_nutrient', config)
         except Exception as e:
@@ -97,8 +171,9 @@ class WaterNutrientController:
 
     def mix_nutrients(self, nutrient_amounts=None):
         """
-        Activates the nutrient pumps sequentially to mix the nutrients into the water.
-        Each pump runs for a duration based on the specified amount in milliliters.
+        Activates the nutrient pumps together to mix the nutrients into the water.
+        Each pump runs for a duration based on the specified amount in milliliters and is turned off
+        as soon as its amount is added.
 
         :param nutrient_amounts: Dictionary of nutrient amounts in milliliters, keyed by nutrient label.
 
@@ -112,35 +187,33 @@ class WaterNutrientController:
             controller.mix_nutrients(nutrient_amounts)
         """
         try:
+            if not self._active_nutrient_pumps:
+                self.logger.debug("No nutrient pumps connected, skipping nutrient mixing")
+                return
+
             if nutrient_amounts is None:
                 nutrient_amounts = self.nutrient_amounts
 
             self.logger.debug("Mixing nutrients: %s", nutrient_amounts)
+            runs = []
             for label, amount in nutrient_amounts.items():
-                if self.config_manager.get('abort_mode', False):
-                    self.logger.warning("ABORT mode activated. Stopping nutrient mixing.")
-                    break
-                if label in self.nutrient_pumps and self.nutrient_pumps[label]['pin'] != -1:
-                    pump = self.nutrient_pumps[label]
-                    duration = amount / pump['flow_rate']
-                    self.relay_controller.turn_on(pump['pin'])
-                    start_time = time.time()
-                    while time.time() - start_time < duration:
-                        if self.config_manager.get('abort_mode', False):
-                            self.logger.warning("ABORT mode activated. Stopping nutrient mixing for %s.", label)
-                            break
-                        time.sleep(0.1)
-                    self.relay_controller.turn_off(pump['pin'])
-                    if not self.config_manager.get('abort_mode', False):
-                        self.logger.info("Added %d ml of %s nutrient", amount, label)
-                    else:
-                        actual_duration = time.time() - start_time
-                        actual_amount = actual_duration * pump['flow_rate']
-                        self.logger.info("Aborted. Added approximately %.2f ml of %s nutrient", actual_amount, label)
-                        break
-                else:
+                pump = self._active_nutrient_pumps.get(label)
+                if pump is not None:
+                    runs.append((label, pump, amount))
+                elif label not in self.nutrient_pumps:
                     self.logger.warning("Unknown nutrient label '%s'", label)
-            if not self.config_manager.get('abort_mode', False):
+
+            # The nutrient pumps draw very little current, so they can always run at the same time
+            if self.abort_mode:
+                self.logger.warning("ABORT mode activated. Stopping nutrient mixing.")
+            elif runs:
+                completed, aborted = self._run_pumps_in_parallel(runs)
+                for label, amount in completed.items():
+                    self.logger.info("Added %d ml of %s nutrient", amount, label)
+                for label, amount in aborted.items():
+                    self.logger.info("Aborted. Added approximately %.2f ml of %s nutrient", amount, label)
+
+            if not self.abort_mode:
                 self.logger.info("Nutrient mixing complete.")
             else:
                 self.logger.warning("Nutrient mixing aborted.")
@@ -161,29 +234,28 @@ class WaterNutrientController:
                 return
 
             self.logger.debug("Adding %d ml of water to mixer...", ml)
-            self.relay_controller.turn_on(self.water_pump['pin'])
-            
-            start_time = time.time()
-            water_added = 0
-            flow_rate = self.water_pump['flow_rate']
+            flow_rate = self.water_pump.flow_rate
+            pump_time = ml / flow_rate
+            run_time = min(pump_time, 60)  # Never run the pump longer than 60 seconds in one go
 
-            while not self.is_mixer_full() and water_added < ml and (time.time() - start_time) < 60:
-                if self.config_manager.get('abort_mode', False):
-                    self.logger.warning("ABORT mode activated. Stopping water filling.")
-                    break
-                time.sleep(0.1)  # Check every 100ms
-                water_added += flow_rate * 0.1
+            stop_event = self._fill_stop_event
+            stop_event.clear()
+            with self.relay_controller.pump_on(self.water_pump.pin):
+                start_ns = time.monotonic_ns()
+                # Sleep for the whole run, the mixer full edge callback and abort wake this up early
+                stopped_early = False
+                if not self.abort_mode and not self.is_mixer_full():
+                    stopped_early = stop_event.wait(timeout=run_time)
+                water_added = (time.monotonic_ns() - start_ns) / NS_PER_SECOND * flow_rate
 
-            self.relay_controller.turn_off(self.water_pump['pin'])
-            
-            if self.config_manager.get('abort_mode', False):
+            if self.abort_mode:
                 self.logger.warning("Water filling aborted. Added approximately %.2f ml of water.", water_added)
-            elif self.is_mixer_full():
+            elif stopped_early or self.is_mixer_full():
                 self.logger.info("Mixer full. Added approximately %.2f ml of water.", water_added)
-            elif water_added >= ml:
-                self.logger.info("Added %d ml of water to mixer.", ml)
-            else:
+            elif run_time < pump_time:
                 self.logger.warning("Filling stopped after 60 seconds. Added approximately %.2f ml of water.", water_added)
+            else:
+                self.logger.info("Added %d ml of water to mixer.", ml)
         except Exception as e:
             self.logger.error("Error filling water to mixer: %s", e)
 
@@ -206,14 +278,14 @@ class WaterNutrientController:
             self.logger.debug("Filling mixer with %d ml of water...", total_ml)
             water_added = 0
             while not self.is_mixer_full() and water_added < total_ml:
-                if self.config_manager.get('abort_mode', False):
+                if self.abort_mode:
                     self.logger.warning("ABORT mode activated. Stopping mixer filling.")
                     break
                 remaining = min(1000, total_ml - water_added)
                 self.fill_water_to_mixer(remaining)
                 water_added += remaining
             
-            if self.config_manager.get('abort_mode', False):
+            if self.abort_mode:
                 self.logger.warning("Mixer filling aborted. Added approximately %d ml of water.", water_added)
             else:
                 self.logger.info("Mixer filled with %d ml of water.", water_added)
@@ -223,29 +295,44 @@ class WaterNutrientController:
     def is_mixer_full(self):
         """
         Checks the fill level sensor to determine if the mixer is full.
+        The level is tracked by an edge callback, so this doesn't cost a read of the sensor.
+        """
+        return self._mixer_full
+
+    def _on_mixer_level(self, pin, level, tick):
+        if level == pigpio.TIMEOUT:
+            return
+        self._mixer_full = level == 1
+        if self._mixer_full:
+            self._fill_stop_event.set()
+
+    def _read_mixer_full(self, pin):
+        """
+        Reads the fill level sensor of the mixer.
+
+        :param pin: Pin of the sensor, -1 if it is not connected
         """
         try:
-            mixer_full_sensor = self.fill_level_sensor.get('mixer_full', {'pin': -1})
-            if mixer_full_sensor['pin'] == -1:
+            if pin == -1:
                 return False
-            
-            # Read the GPIO input
-            is_full = self.relay_controller.get_pin_state(mixer_full_sensor['pin'])
-            return is_full
+
+            return bool(self.relay_controller.get_pin_state(pin))
         except Exception as e:
             self.logger.error("Error checking if mixer is full: %s", e)
             return False
-    
+
     def is_nutrient_tank_low(self):
         """
         Checks if the nutrient tank is low.
         """
         try:
             self.logger.debug("Checking if nutrient tank is low")
-            nutrient_tank_sensor = self.fill_level_sensor.get('nutrient_tank_low', {'pin': -1})
-            
-            is_low = self.relay_controller.get_pin_state(nutrient_tank_sensor['pin'])
-            
+            pin = self._level_sensor_pins.get('nutrient_tank_low')
+            if pin is None:
+                return False
+
+            is_low = self.relay_controller.get_pin_state(pin)
+
             self.logger.debug("Nutrient tank low status: %s", is_low)
             return is_low
         except Exception as e:
@@ -258,19 +345,24 @@ class WaterNutrientController:
         """
         try:
             self.logger.debug("Checking if water tank is low")
-            water_tank_sensor = self.fill_level_sensor.get('water_tank_low', {'pin': -1})
-            
-            is_low = self.relay_controller.get_pin_state(water_tank_sensor['pin'])
-            
+            pin = self._level_sensor_pins.get('water_tank_low')
+            if pin is None:
+                return False
+
+            is_low = self.relay_controller.get_pin_state(pin)
+
             self.logger.debug("Water tank low status: %s", is_low)
             return is_low
         except Exception as e:
             self.logger.error("Error checking if water tank is low: %s", e)
             return False
+
     def distribute_to_plants(self, ml_per_plant=None):
         """
         Activates the distribution pumps to deliver the nutrient solution to the plants.
-        Each pump runs sequentially to ensure equal distribution.
+        Each pump runs sequentially to ensure equal distribution, unless 'parallel_distribution'
+        is enabled in which case all pumps run at the same time.
+        With 'wave_distribution' enabled the sequential runs are timed by a pigpio waveform.
 
         :param ml_per_plant: Amount of nutrient solution to distribute to each plant in milliliters
         """
@@ -278,41 +370,160 @@ class WaterNutrientController:
             if ml_per_plant is None:
                 ml_per_plant = self.ml_per_plant
 
+            if self.parallel_distribution:
+                self._distribute_to_plants_parallel(ml_per_plant)
+                return
+
+            if self.wave_distribution and self._distribute_to_plants_wave(ml_per_plant):
+                return
+
             self.logger.debug("Distributing %d ml of nutrient solution to each plant", ml_per_plant)
             for plant_id, pump in self.distribution_pumps.items():
-                if self.config_manager.get('abort_mode', False):
+                if self.abort_mode:
                     self.logger.warning("ABORT mode activated. Stopping distribution.")
                     break
                 
-                duration = ml_per_plant / pump['flow_rate']
-                start_time = time.time()
-                self.relay_controller.turn_on(pump['pin'])
-                
-                while time.time() - start_time < duration:
-                    if self.config_manager.get('abort_mode', False):
+                duration = ml_per_plant / pump.flow_rate
+                start_ns = time.monotonic_ns()
+                with self.relay_controller.pump_on(pump.pin):
+                    if self.abort_event.wait(timeout=duration):
                         self.logger.warning("ABORT mode activated. Stopping distribution for plant: %s", plant_id)
-                        break
-                    time.sleep(0.1)  # Check abort mode every 100ms
                 
-                self.relay_controller.turn_off(pump['pin'])
-                
-                if not self.config_manager.get('abort_mode', False):
+                if not self.abort_mode:
                     self.logger.info("Distribution complete for plant: %s", plant_id)
                 else:
-                    actual_duration = time.time() - start_time
-                    actual_ml = actual_duration * pump['flow_rate']
+                    actual_duration = (time.monotonic_ns() - start_ns) / NS_PER_SECOND
+                    actual_ml = actual_duration * pump.flow_rate
                     self.logger.info("Distribution aborted for plant: %s. Approximate amount distributed: %.2f ml", plant_id, actual_ml)
                     break
             
-            if not self.config_manager.get('abort_mode', False):
+            if not self.abort_mode:
                 self.logger.info("Distribution complete for all plants.")
             else:
                 self.logger.warning("Distribution aborted due to ABORT mode.")
         except Exception as e:
             self.logger.error("Error distributing to plants: %s", e)
-            for pump in self.distribution_pumps.values():
-                self.relay_controller.turn_off(pump['pin']) 
-                
+
+    def _distribute_to_plants_wave(self, ml_per_plant):
+        """
+        Runs the distribution pumps one after another as a single pigpio waveform, so the run times
+        are timed by the daemon instead of sleeps and writes from Python.
+
+        :param ml_per_plant: Amount of nutrient solution to distribute to each plant in milliliters
+        :return: False if the waveform couldn't be started and the pumps have to be run from Python
+        """
+        runs = [(plant_id, pump, int(ml_per_plant * US_PER_SECOND / pump.flow_rate))
+                for plant_id, pump in self.distribution_pumps.items() if pump.pin != -1]
+        if not runs or self.abort_mode:
+            return False
+        # Every step switches the previous pump off and the next one on with the same write
+        steps = []
+        previous = ()
+        for _, pump, duration_us in runs:
+            steps.append(((pump.pin,), previous, duration_us))
+            previous = (pump.pin,)
+        steps.append(((), previous, 0))
+        wave_id = self.relay_controller.play_wave(steps)
+        if wave_id is None:
+            return False
+
+        self.logger.debug("Distributing %d ml of nutrient solution to each plant as a waveform", ml_per_plant)
+        start_ns = time.monotonic_ns()
+        total_us = sum(duration_us for _, _, duration_us in runs)
+        aborted = self.abort_event.wait(timeout=total_us / US_PER_SECOND)
+        # The wave and this wait don't run on the same clock, let the daemon finish the last step
+        while not aborted and self.relay_controller.wave_busy():
+            aborted = self.abort_event.wait(timeout=0.01)
+        elapsed_us = (time.monotonic_ns() - start_ns) // 1000
+        self.relay_controller.stop_wave(wave_id)
+        if aborted:
+            self.relay_controller.turn_off_mask(self.relay_controller.bank_mask(pump.pin for _, pump, _ in runs))
+
+        offset_us = 0
+        for plant_id, pump, duration_us in runs:
+            if not aborted or offset_us + duration_us <= elapsed_us:
+                self.logger.info("Distribution complete for plant: %s", plant_id)
+            elif offset_us < elapsed_us:
+                actual_ml = (elapsed_us - offset_us) / US_PER_SECOND * pump.flow_rate
+                self.logger.info("Distribution aborted for plant: %s. Approximate amount distributed: %.2f ml", plant_id, actual_ml)
+            offset_us += duration_us
+
+        if not aborted:
+            self.logger.info("Distribution complete for all plants.")
+        else:
+            self.logger.warning("Distribution aborted due to ABORT mode.")
+        return True
+
+    def _distribute_to_plants_parallel(self, ml_per_plant):
+        """
+        Runs all distribution pumps together, so the total runtime is the longest single pump run
+        instead of the sum of all runs.
+
+        :param ml_per_plant: Amount of nutrient solution to distribute to each plant in milliliters
+        """
+        self.logger.debug("Distributing %d ml of nutrient solution to each plant in parallel", ml_per_plant)
+        if self.abort_mode:
+            self.logger.warning("ABORT mode activated. Stopping distribution.")
+            return
+
+        completed, aborted = self._run_pumps_in_parallel(
+            [(plant_id, pump, ml_per_plant) for plant_id, pump in self.distribution_pumps.items()]
+        )
+        for plant_id in completed:
+            self.logger.info("Distribution complete for plant: %s", plant_id)
+        for plant_id, actual_ml in aborted.items():
+            self.logger.info("Distribution aborted for plant: %s. Approximate amount distributed: %.2f ml", plant_id, actual_ml)
+
+        if not aborted:
+            self.logger.info("Distribution complete for all plants.")
+        else:
+            self.logger.warning("Distribution aborted due to ABORT mode.")
+
+    def _run_pumps_in_parallel(self, runs):
+        """
+        Starts all given pumps at once and turns each one off as soon as it delivered its amount.
+
+        :param runs: List of (label, pump, ml) tuples
+        :return: Tuple of two dictionaries keyed by label: the ml delivered by pumps that completed,
+                 and the approximate ml delivered by pumps that were stopped by an abort.
+        """
+        completed = {}
+        aborted = {}
+        # Group the pumps by run time (shortest first), so every stop boundary is a single batched write.
+        # Pumps with nothing to deliver are not switched at all.
+        schedule = {}
+        for label, pump, ml in runs:
+            if ml > 0:
+                schedule.setdefault(int(ml * NS_PER_SECOND / pump.flow_rate), []).append((label, pump, ml))
+            else:
+                completed[label] = 0
+        schedule = [(duration_ns, group, self.relay_controller.bank_mask(pump.pin for _, pump, _ in group))
+                    for duration_ns, group in sorted(schedule.items())]
+        if not schedule:
+            return completed, aborted
+
+        running_mask = 0
+        for _, _, group_mask in schedule:
+            running_mask |= group_mask
+        if not self.relay_controller.turn_on_mask(running_mask):
+            return completed, {label: 0 for _, group, _ in schedule for label, _, _ in group}
+        start_ns = time.monotonic_ns()
+        for index, (duration_ns, group, group_mask) in enumerate(schedule):
+            remaining_ns = start_ns + duration_ns - time.monotonic_ns()
+            if self.abort_event.wait(timeout=max(0, remaining_ns) / NS_PER_SECOND):
+                actual_duration = (time.monotonic_ns() - start_ns) / NS_PER_SECOND
+                # Turning off works in ABORT mode too, so the pumps still running are stopped right here
+                self.relay_controller.turn_off_mask(running_mask)
+                for _, group_left, _ in schedule[index:]:
+                    for label, pump, _ in group_left:
+                        aborted[label] = actual_duration * pump.flow_rate
+                break
+            self.relay_controller.turn_off_mask(group_mask)
+            running_mask &= ~group_mask
+            for label, _, ml in group:
+                completed[label] = ml
+        return completed, aborted
+
     def distribute_to_plant(self, plant_id, ml=None):
         """
         Activates the distribution pump for a specific plant to deliver the nutrient solution.
@@ -335,27 +546,20 @@ class WaterNutrientController:
                 self.logger.warning("No distribution pump with label %s found for plant: %s", plant['water_pump_id'], plant_id)
                 return
             
-            duration = ml / pump['flow_rate']
-            start_time = time.time()
-            self.relay_controller.turn_on(pump['pin'])
-            
-            while time.time() - start_time < duration:
-                if self.config_manager.get('abort_mode', False):
+            duration = ml / pump.flow_rate
+            start_ns = time.monotonic_ns()
+            with self.relay_controller.pump_on(pump.pin):
+                if self.abort_event.wait(timeout=duration):
                     self.logger.warning("ABORT mode activated. Stopping distribution for plant: %s", plant_id)
-                    break
-                time.sleep(0.1)  # Check abort mode every 100ms
             
-            self.relay_controller.turn_off(pump['pin'])
-            
-            if not self.config_manager.get('abort_mode', False):
+            if not self.abort_mode:
                 self.logger.info("Distribution complete for plant: %s", plant_id)
             else:
-                actual_duration = time.time() - start_time
-                actual_ml = actual_duration * pump['flow_rate']
+                actual_duration = (time.monotonic_ns() - start_ns) / NS_PER_SECOND
+                actual_ml = actual_duration * pump.flow_rate
                 self.logger.info("Distribution aborted for plant: %s. Approximate amount distributed: %.2f ml", plant_id, actual_ml)
         except Exception as e:
             self.logger.error("Error distributing to plant %s: %s", plant_id, e)
-            self.relay_controller.turn_off(pump['pin'])  # Ensure pump is turned off in case of error
             
     def sensor_based_distribute_to_plant(self, plant_id):
         """
@@ -375,43 +579,53 @@ class WaterNutrientController:
                 self.logger.warning("No distribution pump with label %s found for plant: %s", plant['water_pump_id'], plant_id)
                 return
             
-            if not plant['moisture_sensor_id'] in self.sensor_controller.get_sensors():
+            sensor_id = plant['moisture_sensor_id']
+            if sensor_id not in self.sensor_controller.get_sensors():
                 self.logger.warning("No soil moisture sensor found for plant: %s", plant_id)
                 return
             
             threshold = plant['watering_threshold']['stop_watering']
             max_watering_time = self.config_manager.get('max_watering_time', 60)
             
-            self.sensor_controller.set_interval(100)
-            max_readings_orig = self.config_manager.get('sensor_hub.max_readings', 5)
-            self.sensor_controller.set_max_readings(1)
-
-            if self.config_manager.get('abort_mode', False):
-                self.logger.info("ABORT mode active, stopping watering for plant: %s", plant_id)
-                return
+            # Remember the sampling settings, so they are restored however the watering ends
+            interval_orig = self.sensor_controller.interval
+            max_readings_orig = self.sensor_controller.max_readings
+            # Pass the interval along, set_max_readings() would otherwise derive and send its own
+            self.sensor_controller.set_max_readings(1, interval=100)
+            try:
+                if self.abort_mode:
+                    self.logger.info("ABORT mode active, stopping watering for plant: %s", plant_id)
+                    return
 
-            self.relay_controller.turn_on(pump['pin'])
-            start_time = time.time()
-            while (time.time() - start_time < max_watering_time and 
-                   self.sensor_controller.get_latest_sensor_data_by_sensor_id(plant['moisture_sensor_id'])['percentage'] < threshold):
-                if self.config_manager.get('abort_mode', False):
-                    self.logger.info("ABORT mode activated, stopping watering for plant: %s", plant_id)
-                    break
-                time.sleep(0.05)
-            
-            self.relay_controller.turn_off(pump['pin'])
-            end_time = time.time()
+                sensor_data_event = self.sensor_controller.sensor_data_event(sensor_id)
+                # Resolved once, the loop runs for every new reading while the pump is on
+                get_latest_sensor_data = self.sensor_controller.get_latest_sensor_data_by_sensor_id
+                with self.relay_controller.pump_on(pump.pin):
+                    start_ns = time.monotonic_ns()
+                    deadline_ns = start_ns + int(max_watering_time * NS_PER_SECOND)
+                    # Only wake up when a new reading arrives (or on abort) instead of polling the latest data
+                    while True:
+                        sensor_data_event.clear()
+                        if self.abort_mode:
+                            self.logger.info("ABORT mode activated, stopping watering for plant: %s", plant_id)
+                            break
+                        if get_latest_sensor_data(sensor_id)['percentage'] >= threshold:
+                            break
+                        remaining_ns = deadline_ns - time.monotonic_ns()
+                        if remaining_ns <= 0 or not sensor_data_event.wait(timeout=remaining_ns / NS_PER_SECOND):
+                            break
+                end_ns = time.monotonic_ns()
             
-            duration = end_time - start_time
-            estimated_water_added = duration * pump['flow_rate']
+                duration = (end_ns - start_ns) / NS_PER_SECOND
+                estimated_water_added = duration * pump.flow_rate
             
-            if duration >= max_watering_time:
-                self.logger.warning("Max watering time reached for plant: %s. Stopping watering.", plant_id)
+                if duration >= max_watering_time:
+                    self.logger.warning("Max watering time reached for plant: %s. Stopping watering.", plant_id)
             
-            self.logger.info("Distribution complete for plant: %s. Estimated water added: %.2f ml", plant_id, estimated_water_added)
-            self.sensor_controller.set_max_readings(max_readings_orig)
-            self.sensor_controller.set_interval(ceil(self.config_manager.get('sensor_hub.interval', 5000)/self.sensor_controller.max_readings))
-            return estimated_water_added
+                self.logger.info("Distribution complete for plant: %s. Estimated water added: %.2f ml", plant_id, estimated_water_added)
+                return estimated_water_added
+            finally:
+                self.sensor_controller.set_max_readings(max_readings_orig, interval=interval_orig)
         except Exception as e:
             self.logger.error("Error in sensor-based distribution to plant %s: %s", plant_id, e)
 
@@ -460,6 +674,7 @@ class WaterNutrientController:
         try:
             self.logger.debug("Reloading configuration for WaterNutrientController")
             self.load_config()
+            self._sync_abort_event()
             self.logger.info("Configuration reloaded for WaterNutrientController")
         except Exception as e:
             self.logger.error("Error reloading configuration: %s", e)
@@ -468,12 +683,33 @@ class WaterNutrientController:
         self.logger.debug("Executing ABORT command in WaterNutrientController")
         # Stop any ongoing operations
         # This might involve setting flags to stop loops in other methods
+        self.abort_event.set()
+        self._fill_stop_event.set()
+        self.sensor_controller.wake_sensor_data_waiters()
+        # A distribution wave would switch the next pump on again
+        self.relay_controller.stop_wave()
+        # Turn off all pumps with a single bank write
+        self.relay_controller.turn_off_mask(self._all_pump_mask)
         self.config_manager.set('abort_mode', True)
-        # Turn off all pumps
-        for pump in self.nutrient_pumps.values():
-            self.relay_controller.turn_off(pump['pin'])
-        self.relay_controller.turn_off(self.water_pump['pin'])
-        for pump in self.distribution_pumps.values():
-            self.relay_controller.turn_off(pump['pin'])
         self.logger.info("ABORT command executed in WaterNutrientController")
-        self.logger.info("ABORT command executed in WaterNutrientController")
\ No newline at end of file
+
+    @property
+    def abort_mode(self):
+        """
+        Whether ABORT mode is active, kept in sync with the 'abort_mode' config key without a config lookup.
+        """
+        return self.abort_event.is_set()
+
+    def _sync_abort_event(self):
+        """
+        Brings the abort event in line with the persisted ABORT mode.
+        """
+        self._on_abort_mode_changed(self.config_manager.get('abort_mode', False))
+
+    def _on_abort_mode_changed(self, abort_mode):
+        if abort_mode:
+            self.abort_event.set()
+            self._fill_stop_event.set()
+            self.sensor_controller.wake_sensor_data_waiters()
+        else:
+            self.abort_event.clear()
\ No newline at end of file
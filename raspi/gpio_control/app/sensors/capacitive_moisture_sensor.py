@@ -1,6 +1,7 @@
 import pigpio
 import time
 import logging
+from app.controller.relay_controller import get_pi
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -10,7 +11,8 @@ class CapacitiveMoistureSensor:
         self.pin = pin
         self.min_moisture = min_moisture
         self.max_moisture = max_moisture
-        self.pi = pigpio.pi('gpio_deamon')
+        self._update_scale()
+        self.pi = get_pi()
         if not self.pi.connected:
             logger.error("Failed to connect to pigpio daemon")
             raise RuntimeError("Failed to connect to pigpio daemon")
@@ -20,22 +22,31 @@ class CapacitiveMoistureSensor:
     def read_raw(self):
         # Read the raw value from the sensor
         raw_value = self.pi.read(self.pin)
-        logger.debug(f"Raw moisture reading from pin {self.pin}: {raw_value}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Raw moisture reading from pin %d: %s", self.pin, raw_value)
         return raw_value
 
     def read_moisture(self):
         # Read the moisture level and convert to percentage
         raw_value = self.read_raw()
         moisture_percentage = self.convert_to_percentage(raw_value)
-        logger.info(f"Moisture level on pin {self.pin}: {moisture_percentage}%")
+        logger.info("Moisture level on pin %d: %s%%", self.pin, moisture_percentage)
         return moisture_percentage
 
     def convert_to_percentage(self, raw_value):
         # Convert the raw value to a percentage
-        moisture_range = self.max_moisture - self.min_moisture
-        moisture_percentage = ((raw_value - self.min_moisture) / moisture_range) * 100
+        moisture_percentage = (raw_value - self.min_moisture) * self._percent_per_step
         return max(0, min(100, moisture_percentage))  # Ensure the result is between 0 and 100
 
+    def _update_scale(self):
+        # Cache the percentage per raw step, so conversions multiply instead of dividing
+        moisture_range = self.max_moisture - self.min_moisture
+        if moisture_range == 0:
+            logger.warning("Min and max moisture of sensor on pin %d are both %s, readings will report 0%%", self.pin, self.min_moisture)
+            self._percent_per_step = 0
+        else:
+            self._percent_per_step = 100 / moisture_range
+
     def calibrate(self, samples=10, delay=1):
         logger.info(f"Starting calibration for sensor on pin {self.pin}")
         readings = []
@@ -45,9 +56,6 @@ class CapacitiveMoistureSensor:
         
         self.min_moisture = min(readings)
         self.max_moisture = max(readings)
+        self._update_scale()
         logger.info(f"Calibration complete. Min: {self.min_moisture}, Max: {self.max_moisture}")
 
-    def __del__(self):
-        if self.pi.connected:
-            self.pi.stop()
-            logger.debug(f"Pigpio connection closed for sensor on pin {self.pin}")
@@ -1,7 +1,9 @@
+import asyncio
+from collections import defaultdict
 import serial
-from paho.mqtt import client as mqtt_client
+import serial_asyncio
+import aiomqtt
 import time
-import threading
 import logging
 import random 
 
@@ -9,15 +11,9 @@ import random
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-baud_rate = 115200
-
 # Serielle Schnittstelle
-try:
-    ser = serial.Serial('/dev/ttyUSB0', baud_rate, timeout=5)
-    logger.info(f"Serial connection established with baud rate {baud_rate}.")
-except serial.SerialException as e:
-    logger.error(f"Failed to connect to serial port: {e}")
-    raise
+serial_port = '/dev/ttyUSB0'
+baud_rate = 115200
 
 # MQTT-Setup
 broker="mqtt"
@@ -30,116 +26,188 @@ RECONNECT_RATE = 2
 MAX_RECONNECT_COUNT = 12
 MAX_RECONNECT_DELAY = 60
 
-def connect_mqtt():
-    def on_connect(client, userdata, flags, rc, properties):
-        if rc == 0:
-            logger.info("Connected to MQTT Broker!")
-        else:
-            logger.error("Failed to connect, return code %d\n", rc)
+# Sensor lines are published in batches, one multi-line payload per topic
+BATCH_WINDOW = 0.02  # seconds
+BATCH_MAX_LINES = 64
 
-    def on_disconnect(client, userdata, flags, rc, properties):
-        logger.info("Disconnected with result code: %s", rc)
-        reconnect_count, reconnect_delay = 0, FIRST_RECONNECT_DELAY
-        while reconnect_count < MAX_RECONNECT_COUNT:
-            logger.info("Reconnecting in %d seconds...", reconnect_delay)
-            time.sleep(reconnect_delay)
-
-            try:
-                client.reconnect()
-                logger.info("Reconnected successfully!")
-                return
-            except Exception as err:
-                logger.error("%s. Reconnect failed. Retrying...", err)
-
-            reconnect_delay *= RECONNECT_RATE
-            reconnect_delay = min(reconnect_delay, MAX_RECONNECT_DELAY)
-            reconnect_count += 1
-        logger.info("Reconnect failed after %s attempts. Exiting...", reconnect_count)
-
-    client = mqtt_client.Client(client_id=client_id, clean_session=True, userdata=None, callback_api_version=mqtt_client.CallbackAPIVersion.VERSION2)
-    client.on_connect = on_connect
-    client.on_disconnect = on_disconnect
-    client.connect(broker, port)
-    return client
-
-# Globale Variablen zur Steuerung
-last_sensor_data = {}
-lock = threading.Lock()
-def process_serial_data():
-    global last_sensor_data
+async def process_serial_data(reader, client):
+    # The stream reader buffers the port and hands out complete lines, so the
+    # event loop only wakes up when a line arrived
     while True:
         try:
-            line = ser.readline()
-            if line:
-                try:
-                    decoded_line = line.decode('utf-8').strip()
-                except UnicodeDecodeError:
-                    logger.warning(f"Failed to decode line using UTF-8: {line}")
-                    decoded_line = line.decode('utf-8', errors='ignore').strip()
-                    
-                with lock:
-                    logger.debug(f"Received message on serial port: `{decoded_line}`")
-                    topic, message = decoded_line.split(" ", 1)
-                    logger.debug(f"Received message on topic `{topic}`: `{message}`")
-                    if topic == "arduino/logs":
-                        logger.info(message)
-                        mqtt_message = f"{topic} {message}"
-                    elif topic.startswith("sensor"):
-                        last_sensor_data[topic] = message
-                        # Format the message for InfluxDB
-                        topic_parts = topic.split('/', 1)
-                        sensor_type = topic_parts[1]
-                        sensor_id = message.split(' ')[0]
-                        if sensor_type == "dht":
-                            humidity = message.split(' ')[1]
-                            temperature = message.split(' ')[2]
-                            
-                            mqtt_message = f"dht,humidity={humidity},temperature={temperature},sensor_id={sensor_id} value={humidity};{temperature}"
-                        else:
-                            value = message.split(' ')[1]
-                            mqtt_message = f"{sensor_type},sensor_id={sensor_id} value={value}"
-                        mqtt_message = f"{mqtt_message} {time.time_ns()}"
-                        result = client.publish(topic, mqtt_message)
-                        status = result[0]
-                        if status == 0:
-                            logger.debug(f"Send `{mqtt_message}` to topic `{topic}`")
-                        else:
-                            logger.error(f"Failed to send message to topic `{topic}`")
-        except Exception as e:
-            logger.error(f"Error processing serial data: {e}")
-
-        time.sleep(0.1)
-
-def on_message(client, userdata, message):
-    global ser
+            line = await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError:
+            logger.error("Serial connection closed")
+            raise
+        except asyncio.LimitOverrunError as e:
+            logger.warning("Discarding overlong line on serial port")
+            await reader.read(e.consumed)
+            continue
+        process_serial_line(line, client)
+
+# InfluxDB line protocol formatters, built once per topic.
+# They work on the raw bytes fields and return the bytes payload aiomqtt publishes as is.
+line_formatters = {}
+
+def get_line_formatter(topic):
+    formatter = line_formatters.get(topic)
+    if formatter is None:
+        sensor_type = topic.split('/', 1)[1]
+        if sensor_type == "dht":
+            # fields: sensor_id humidity temperature
+            def formatter(fields, timestamp):
+                return b"dht,humidity=%s,temperature=%s,sensor_id=%s value=%s;%s %d" % (
+                    fields[1], fields[2], fields[0], fields[1], fields[2], timestamp)
+        else:
+            # fields: sensor_id value
+            template = sensor_type.encode('utf-8') + b",sensor_id=%s value=%s %d"
+            def formatter(fields, timestamp):
+                return template % (fields[0], fields[1], timestamp)
+        line_formatters[topic] = formatter
+    return formatter
+
+def process_serial_line(line, client):
+    try:
+        line = line.strip()
+        if not line:
+            return
+
+        # Only the topic is decoded, the sensor fields are passed on as bytes
+        topic, message = line.split(b" ", 1)
+        topic = topic.decode('utf-8')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Received message on topic `%s`: `%s`", topic, message)
+        if topic == "arduino/logs":
+            # Arduino logs only go to the proxy's own log output
+            logger.info(message.decode('utf-8', errors='ignore'))
+        elif topic.startswith("sensor"):
+            # Formatted for InfluxDB when the batch is flushed
+            queue_sensor_line(topic, message.split(b' '), client)
+    except Exception as e:
+        logger.error(f"Error processing serial data: {e}")
+
+# Strong references to the fire-and-forget tasks, the event loop only keeps weak ones
+background_tasks = set()
+
+def spawn(coro):
+    task = asyncio.ensure_future(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+pending_lines = defaultdict(list)
+pending_count = 0
+flush_handle = None
+
+def queue_sensor_line(topic, fields, client):
+    global pending_count, flush_handle
+    # Stamped on arrival, the batch is only published up to BATCH_WINDOW later
+    pending_lines[topic].append((fields, time.time_ns()))
+    pending_count += 1
+    if pending_count >= BATCH_MAX_LINES:
+        flush_sensor_lines(client)
+    elif flush_handle is None:
+        flush_handle = asyncio.get_running_loop().call_later(BATCH_WINDOW, flush_sensor_lines, client)
+
+def flush_sensor_lines(client):
+    global pending_count, flush_handle
+    if flush_handle is not None:
+        flush_handle.cancel()
+        flush_handle = None
+    batch = dict(pending_lines)
+    pending_lines.clear()
+    pending_count = 0
+    spawn(publish_sensor_lines(client, batch))
+
+async def publish_sensor_lines(client, batch):
+    for topic, lines in batch.items():
+        formatter = get_line_formatter(topic)
+        formatted_lines = []
+        for fields, timestamp in lines:
+            try:
+                formatted_lines.append(formatter(fields, timestamp))
+            except IndexError:
+                logger.error(f"Invalid sensor data on topic `{topic}`: {b' '.join(fields)}")
+        if not formatted_lines:
+            continue
+        mqtt_message = b"\n".join(formatted_lines)
+        try:
+            await client.publish(topic, mqtt_message, qos=0)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Send `%s` to topic `%s`", mqtt_message, topic)
+        except aiomqtt.MqttError as e:
+            logger.error(f"Failed to send message to topic `{topic}`: {e}")
+
+# Commands with a fixed translation, written as prebuilt bytes
+SERIAL_COMMANDS = {
+    b"REQUEST_DATA": b'GET_DATA\n',
+    b"CLEAR_ALL": b'CLEAR_ALL\n',
+}
+
+def handle_command(writer, payload):
     try:
-        command = message.payload.decode('utf-8')
-        if command == "REQUEST_DATA":
-            ser.write(b'GET_DATA\n')
-        elif command == "RESTART":
-            ser.setDTR(False)
-            time.sleep(1)
-            ser.setDTR(True)
+        # Commands are plain ASCII, so the payload bytes are forwarded without a decode/encode round trip
+        serial_command = SERIAL_COMMANDS.get(payload)
+        if serial_command is not None:
+            writer.write(serial_command)
+        elif payload == b"RESTART":
+            spawn(restart_arduino(writer))
         else:
-            ser.write(command.encode('utf-8') + b'\n')
+            writer.write(payload + b'\n')
     except Exception as e:
         logger.error(f"Error processing MQTT message: {e}")
 
-# MQTT-Callback setzen
-client = connect_mqtt()
-client.on_message = on_message
-client.subscribe("arduino/commands")
-client.loop_start()
+async def restart_arduino(writer):
+    ser = writer.transport.serial
+    ser.dtr = False
+    await asyncio.sleep(1)
+    ser.dtr = True
+
+async def process_commands(client, writer):
+    async for message in client.messages:
+        handle_command(writer, message.payload)
+
+async def run_mqtt(client, reader, writer):
+    # Serial data and MQTT commands share the loop, whichever fails first takes the other one down
+    tasks = [
+        asyncio.ensure_future(process_serial_data(reader, client)),
+        asyncio.ensure_future(process_commands(client, writer)),
+    ]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for task in tasks:
+            task.cancel()
+    for task in done:
+        task.result()
+
+async def main():
+    try:
+        reader, writer = await serial_asyncio.open_serial_connection(url=serial_port, baudrate=baud_rate)
+        logger.info(f"Serial connection established with baud rate {baud_rate}.")
+    except serial.SerialException as e:
+        logger.error(f"Failed to connect to serial port: {e}")
+        raise
 
-# Starten des Threads zum Lesen der seriellen Daten
-serial_thread = threading.Thread(target=process_serial_data)
-serial_thread.start()
+    reconnect_count, reconnect_delay = 0, FIRST_RECONNECT_DELAY
+    try:
+        while reconnect_count < MAX_RECONNECT_COUNT:
+            try:
+                async with aiomqtt.Client(broker, port, identifier=client_id) as client:
+                    logger.info("Connected to MQTT Broker!")
+                    reconnect_count, reconnect_delay = 0, FIRST_RECONNECT_DELAY
+                    await client.subscribe("arduino/commands")
+                    await run_mqtt(client, reader, writer)
+            except aiomqtt.MqttError as err:
+                logger.error("%s. Reconnecting in %d seconds...", err, reconnect_delay)
+                await asyncio.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * RECONNECT_RATE, MAX_RECONNECT_DELAY)
+                reconnect_count += 1
+        logger.info("Reconnect failed after %s attempts. Exiting...", reconnect_count)
+    finally:
+        writer.close()
 
-# Haupt-Thread wartet auf serielle Befehle
 try:
-    while True:
-        time.sleep(1)
+    asyncio.run(main())
 except KeyboardInterrupt:
-    ser.close()
-    client.loop_stop()
     logger.info("Exiting program...")